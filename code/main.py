@@ -12,13 +12,252 @@ Project owned and maintained by [Arturo Soberon](
 """
 
 # TO-DO:
-# Add `multigraph` parameter that calls `create_using=nx.MultiGraph`
-# when `multigraph=True`. Raise warning: `Network(directed=True)`.
+# Raise warning: `Network(directed=True)` when `multigraph=True`.
 
 
 # Imports
 from typing import Optional
-from networkx import from_pandas_edgelist, set_node_attributes
+import numpy as np
+import pandas as pd
+from networkx import Graph, MultiGraph, set_node_attributes
+
+
+# Columns with fewer rows than this are mapped to colors with a plain lookup.
+# Encoding becomes faster at about 500 rows for Arrow-backed and categorical
+# columns and 1,000 rows for object columns (pandas 2.1.4, 8 colors)
+_SMALL_COLOR_ROWS = 500
+
+
+# Function to convert a column to a list
+def _to_list(col):
+    """Return `col` as a list, like `to_dict` would return its values.
+
+    Missing values of dtypes that use `pd.NA` (e.g., `Int64` or `string`)
+    become None, as `pd.NA` is not JSON serializable.
+    """
+    if getattr(col.dtype, 'na_value', None) is pd.NA:
+        return col.to_numpy(dtype=object, na_value=None).tolist()
+    return col.tolist()
+
+
+# Function to validate color arguments
+def _validate_color(color: Optional[str], color_map: Optional[dict]):
+    """Return True if colors must be set, False if neither argument is passed.
+
+    Raises a TypeError if only one of `color` and `color_map` is passed or if
+    either of them has the wrong type.
+    """
+    if color is None and color_map is None:
+        return False
+    if color is not None and color_map is None:
+        raise TypeError(
+            '`color_map` must be a dictionary when `color` is passed.'
+        )
+    if color is None and color_map is not None:
+        raise TypeError(
+            '`color` must be a string when `color_map` is passed.'
+        )
+    if not (isinstance(color, str) and isinstance(color_map, dict)):
+        raise TypeError(
+            '`color` must be a string and `color_map` must be a dictionary.'
+        )
+    return True
+
+
+# Function to map a column's values to colors
+def _map_colors(values, color_map: dict):
+    """Map each value in `values` to its color in `color_map`.
+
+    Equivalent to `values.map(color_map)`. Columns shorter than
+    `_SMALL_COLOR_ROWS` without missing values are looked up once per row.
+    Longer columns are encoded first, so `color_map` is looked up once per
+    unique value instead. Missing values stay missing.
+    """
+    # Look up short columns row by row, which beats encoding them. Missing
+    # values raise a KeyError partway through, and the column is then encoded
+    # below anyway. This costs at most one wasted short loop, whereas checking
+    # `hasnans` first would cost about as much as the loop on every call
+    if len(values) < _SMALL_COLOR_ROWS:
+        get = color_map.__getitem__
+        try:
+            return np.array([get(v) for v in values.to_numpy()], dtype=object)
+        except KeyError:
+            pass
+
+    # Dictionary-encode Arrow-backed columns without leaving Arrow
+    dtype = values.dtype
+    if isinstance(dtype, pd.ArrowDtype) or (
+        isinstance(dtype, pd.StringDtype) and dtype.storage == 'pyarrow'
+    ):
+        arr = values.array.__arrow_array__()
+        if hasattr(arr, 'combine_chunks'):
+            arr = arr.combine_chunks()
+        arr = arr.dictionary_encode()
+        categories = arr.dictionary.to_pylist()
+        codes = arr.indices.fill_null(-1).to_numpy()
+    else:
+        # Factorize rather than use `pd.Categorical`, which would keep the
+        # unused categories of categorical columns
+        codes, categories = pd.factorize(values)
+    palette = np.array(
+        [color_map[c] for c in categories] + [np.nan], dtype=object
+    )
+    # Missing values have code -1, which points to the trailing NaN
+    return palette[codes]
+
+
+# Function to validate color arguments against a dataframe
+def _validate_color_map(
+    df,
+    color: Optional[str],
+    color_map: Optional[dict]
+):
+    """Raise an error if `color_map` does not cover column `color` of `df`.
+
+    Also raises the errors of `_validate_color`.
+    """
+    if _validate_color(color, color_map):
+        values = df[color].dropna().drop_duplicates().tolist()
+        missing = set(values) - set(color_map)
+        assert not missing, (
+            'Values {} of column "{}" not found in `color_map`.'
+            .format(missing, color)
+        )
+
+
+# Function to validate the arguments of `transform_edges`
+def _validate_edges(
+    edges_df,
+    source: str,
+    target: str,
+    color: Optional[str] = None,
+    color_map: Optional[dict] = None,
+    hover: Optional[str] = None
+):
+    """Raise an error if the arguments of `transform_edges` are invalid."""
+    # Assert if columns required by user exist in edges_df
+    cols_usr = [
+        col for col in [source, target, color, hover] if col is not None
+    ]
+    missing = set(cols_usr) - set(edges_df.columns)
+    assert not missing, 'Columns {} not found in `edges_df`.'.format(missing)
+
+    # Assert that `color_map` covers every value of column `color`
+    _validate_color_map(edges_df, color, color_map)
+
+    # Assert that `hover` is a string
+    if hover is not None:
+        assert isinstance(hover, str), '`hover` must be a string.'
+
+
+# Function to validate the arguments of `transform_nodes`
+def _validate_nodes(
+    nodes_df,
+    id: str,
+    label: Optional[str] = None,
+    color: Optional[str] = None,
+    color_map: Optional[dict] = None,
+    hover: Optional[str] = None
+):
+    """Raise an error if the arguments of `transform_nodes` are invalid."""
+    # Assert that columns passed by user exist in nodes
+    assert id is not None, '`id` must be passed when `nodes_df` is passed.'
+    cols_usr = [
+        col for col in [id, label, color, hover] if col is not None
+    ]
+    missing = set(cols_usr) - set(nodes_df.columns)
+    assert not missing, 'Columns {} not found in `nodes_df`.'.format(missing)
+
+    # Assert that `label` is a string
+    if label is not None:
+        assert isinstance(label, str), '`label` must be a string.'
+
+    # Assert that `color_map` covers every value of column `color`
+    _validate_color_map(nodes_df, color, color_map)
+
+    # Assert that `hover` is a string
+    if hover is not None:
+        assert isinstance(hover, str), '`hover` must be a string.'
+
+
+# Function to validate the arguments of `nx_from_pandas`
+def _validate_nx_inputs(
+    edges_df,
+    edges_source: str,
+    edges_target: str,
+    edges_color: Optional[str] = None,
+    edges_color_map: Optional[dict] = None,
+    edges_hover: Optional[str] = None,
+    nodes_df=None,
+    nodes_id: Optional[str] = None,
+    nodes_label: Optional[str] = None,
+    nodes_color: Optional[str] = None,
+    nodes_color_map: Optional[dict] = None,
+    nodes_hover: Optional[str] = None
+):
+    """Raise an error if the arguments of `nx_from_pandas` are invalid."""
+    _validate_edges(
+        edges_df=edges_df,
+        source=edges_source,
+        target=edges_target,
+        color=edges_color,
+        color_map=edges_color_map,
+        hover=edges_hover
+    )
+    if nodes_df is not None:
+        _validate_nodes(
+            nodes_df=nodes_df,
+            id=nodes_id,
+            label=nodes_label,
+            color=nodes_color,
+            color_map=nodes_color_map,
+            hover=nodes_hover
+        )
+
+
+# Function to extract the columns of a pyvis network's edges
+def _edge_columns(
+    edges_df,
+    source: str,
+    target: str,
+    color: Optional[str] = None,
+    color_map: Optional[dict] = None,
+    hover: Optional[str] = None,
+    validate: bool = True
+):
+    """Return the source, target and attribute columns of pyvis' edges.
+
+    Does the work of `transform_edges` without building a new dataframe. The
+    attributes are returned as a dictionary mapping pyvis' attribute names to
+    columns. See `transform_edges` for a description of the parameters.
+    """
+    # Validate arguments
+    if validate:
+        _validate_edges(
+            edges_df=edges_df,
+            source=source,
+            target=target,
+            color=color,
+            color_map=color_map,
+            hover=hover
+        )
+
+    # Init attributes to be returned
+    attrs = {}
+
+    # Declare `color` attribute
+    if color is not None:
+        attrs['color'] = _map_colors(edges_df[color], color_map)
+
+    # Declare `title` attribute (with missing values as in `_to_list`)
+    if hover is not None:
+        title = edges_df[hover]
+        if getattr(title.dtype, 'na_value', None) is pd.NA:
+            title = pd.Series(_to_list(title), index=title.index, dtype=object)
+        attrs['title'] = title
+
+    # Return source, target and attribute columns
+    return edges_df[source], edges_df[target], attrs
 
 
 # Function to prepare edges for pyvis
@@ -28,7 +267,8 @@ def transform_edges(
     target: str,
     color: Optional[str] = None,
     color_map: Optional[dict] = None,
-    hover: Optional[str] = None
+    hover: Optional[str] = None,
+    validate: bool = True
 ):
     """Transform `edges_df` to be compatible with a pyvis network.
 
@@ -48,42 +288,26 @@ def transform_edges(
     hover : str
         The name of the column that contains the text that will be displayed
         when the user hovers over an edge.
+    validate : bool
+        Whether to validate the arguments. Only pass `False` if they are known
+        to be valid.
     """
-    # Assert if columns required by user exist in edges_df
-    cols_usr = [
-        col for col in [source, target, color, hover] if col is not None
-    ]
-    msg = 'Column "{}" not found in `edges_df`.'
-    for col in cols_usr:
-        assert col in edges_df.columns, msg.format(col)
-
-    # Init column names to be returned
-    cols = [source, target]
-
-    # Declare `color` column
-    if color is not None and color_map is not None:
-        assert isinstance(color, str) and isinstance(color_map, dict), (
-            '`color` must be a string and `color_map` must be a dictionary.'
-        )
-        edges_df['color'] = edges_df[color].map(color_map)
-        cols.append('color')
-    elif color is not None and color_map is None:
-        raise TypeError(
-            '`color_map` must be a dictionary when `color` is passed.'
-        )
-    elif color is None and color_map is not None:
-        raise TypeError(
-            '`color` must be a string when `color_map` is passed.'
-        )
-
-    # Declare `title` column
-    if hover is not None:
-        assert isinstance(hover, str), '`hover` must be a string.'
-        edges_df = edges_df.rename(columns={hover: 'title'})
-        cols.append('title')
+    # Get edge columns
+    u, v, attrs = _edge_columns(
+        edges_df=edges_df,
+        source=source,
+        target=target,
+        color=color,
+        color_map=color_map,
+        hover=hover,
+        validate=validate
+    )
 
-    # Return transformed edges
-    return edges_df[cols]
+    # Return transformed edges (as a plain selection if there are no
+    # attributes)
+    if not attrs:
+        return edges_df[[source, target]]
+    return pd.DataFrame({source: u, target: v, **attrs})
 
 
 # Function to prepare nodes for pyvis
@@ -93,7 +317,8 @@ def transform_nodes(
     label: Optional[str] = None,
     color: Optional[str] = None,
     color_map: Optional[str] = None,
-    hover: Optional[str] = None
+    hover: Optional[str] = None,
+    validate: bool = True
 ):
     """Transform `nodes_df` to be compatible with pyvis.
 
@@ -114,55 +339,74 @@ def transform_nodes(
     hover : str
         The name of the column that contains the text that will be displayed
         when the user hovers over a node.
+    validate : bool
+        Whether to validate the arguments. Only pass `False` if they are known
+        to be valid.
     """
-    # Assert that columns passed by user exist in nodes
-    cols_usr = [
-        col for col in [id, label, color, hover] if col is not None
-    ]
-    msg = 'Column "{}" not found in `nodes_df`.'
-    for col in cols_usr:
-        assert col in nodes_df.columns, msg.format(col)
+    # Validate arguments
+    if validate:
+        _validate_nodes(
+            nodes_df=nodes_df,
+            id=id,
+            label=label,
+            color=color,
+            color_map=color_map,
+            hover=hover
+        )
 
-    # Copy `nodes_df` to avoid overwrite
-    temp = nodes_df.copy(deep=True)
+    # Assert that node IDs are unique, as each one becomes a single node
+    if not nodes_df[id].is_unique:
+        raise ValueError(
+            'Column "{}" of `nodes_df` must not contain duplicates.'
+            .format(id)
+        )
+
+    # Return nodes without attributes if user passed none
+    if label is None and color is None and color_map is None and hover is None:
+        return {node: {} for node in nodes_df[id].tolist()}
+
+    # Keep only the columns required by user and copy them to avoid
+    # overwrite. A shallow copy suffices because `temp` is only modified by
+    # adding columns and renaming, never in place
+    cols_usr = list(dict.fromkeys(
+        col for col in [id, label, color, hover] if col is not None
+    ))
+    temp = (
+        nodes_df if list(nodes_df.columns) == cols_usr
+        else nodes_df.loc[:, cols_usr]
+    ).copy(deep=False)
 
     # Init column names to be returned
     cols = [id]
 
     # Add label column
     if label is not None:
-        assert isinstance(label, str), '`label` must be a string.'
-        temp['label'] = temp[label].astype(str)
+        labels = temp[label]
+        # Only cast to `str` if labels do not have a string dtype already
+        if not isinstance(labels.dtype, pd.StringDtype):
+            labels = labels.astype(str)
+        temp['label'] = labels
         cols.append('label')
 
     # Declare `color` column
-    if color is not None and color_map is not None:
-        assert isinstance(color, str) and isinstance(color_map, dict), (
-            '`color` must be a string and `color_map` must be a dictionary.'
-        )
-        temp['color'] = temp[color].map(color_map)
+    if color is not None:
+        temp['color'] = _map_colors(temp[color], color_map)
         cols.append('color')
-    elif color is not None and color_map is None:
-        raise TypeError(
-            '`color_map` must be a dictionary when `color` is passed.'
-        )
-    elif color is None and color_map is not None:
-        raise TypeError(
-            '`color` must be a string when `color_map` is passed.'
-        )
 
     # Add hover column
     if hover is not None:
-        assert isinstance(hover, str), '`hover` must be a string.'
         temp = temp.rename(columns={hover: 'title'})
         cols.append('title')
 
-    # Return transformed nodes_df as dict
-    return (
-        temp[cols]
-        .set_index(id)
-        .to_dict(orient='index')
-    )
+    # Return transformed nodes_df as dict (built column-wise, which is much
+    # faster than `to_dict(orient='index')`)
+    ids = temp[id].tolist()
+    names = [col for col in cols if col != id]
+    values = [_to_list(temp[col]) for col in names]
+    return {
+        ids[i]: {names[j]: values[j][i] for j in range(len(names))}
+        for i in range(len(ids))
+    }
 
 
 # Function to create an nx graph from an edges and nodes table
@@ -178,7 +422,8 @@ def nx_from_pandas(
     nodes_label: Optional[str] = None,
     nodes_color: Optional[str] = None,
     nodes_color_map: Optional[str] = None,
-    nodes_hover: Optional[str] = None
+    nodes_hover: Optional[str] = None,
+    multigraph: bool = False
 ):
     """Convert pandas dataframes to a networkx graph compatible with pyvis.
 
@@ -219,59 +464,77 @@ def nx_from_pandas(
     nodes_hover : str
         The name of the column that contains the text that will be displayed
         when the user hovers over a node.
+    multigraph : bool
+        Whether to return a `networkx.MultiGraph`, which keeps every edge
+        between the same pair of nodes, instead of a `networkx.Graph`.
 
     Returns
     -------
     A networkx graph with edge and node attributes named according to pyvis.
     """
-    # Transform edges
-    edges_df = transform_edges(
+    # Validate all arguments at once
+    _validate_nx_inputs(
+        edges_df=edges_df,
+        edges_source=edges_source,
+        edges_target=edges_target,
+        edges_color=edges_color,
+        edges_color_map=edges_color_map,
+        edges_hover=edges_hover,
+        nodes_df=nodes_df,
+        nodes_id=nodes_id,
+        nodes_label=nodes_label,
+        nodes_color=nodes_color,
+        nodes_color_map=nodes_color_map,
+        nodes_hover=nodes_hover
+    )
+
+    # Get edge columns
+    u, v, attrs = _edge_columns(
         edges_df=edges_df,
         source=edges_source,
         target=edges_target,
         color=edges_color,
         color_map=edges_color_map,
-        hover=edges_hover
+        hover=edges_hover,
+        validate=False
     )
 
-    # Transform nodes
-    if nodes_df is not None:
-        transform_nodes(
-            nodes_df=nodes_df,
-            id=nodes_id,
-            label=nodes_label,
-            color=nodes_color,
-            color_map=nodes_color_map,
-            hover=nodes_hover
-        )
-
-    # Get edge attributes
-    edge_attr = [
-        col for col in edges_df.columns if col not in ['src', 'dst']
-    ]
-    edge_attr = edge_attr if len(edge_attr) > 0 else None
+    # Transform nodes (if any)
+    node_attrs = transform_nodes(
+        nodes_df=nodes_df,
+        id=nodes_id,
+        label=nodes_label,
+        color=nodes_color,
+        color_map=nodes_color_map,
+        hover=nodes_hover,
+        validate=False
+    ) if nodes_df is not None else None
 
-    # Declare graph from edges
-    G = from_pandas_edgelist(
-        df=edges_df,
-        source=edges_source,
-        target=edges_target,
-        edge_attr=edge_attr
-    )
+    # Declare graph from edges (adding them straight from the edge columns is
+    # much faster than building a dataframe for `from_pandas_edgelist`)
+    G = MultiGraph() if multigraph else Graph()
+    u, v = u.tolist(), v.tolist()
+    if len(attrs) == 1:
+        # Edges have either a color or a title. Dict literals are much faster
+        # than `dict(zip(names, row))`
+        name = next(iter(attrs))
+        edges = (
+            (s, t, {name: x}) for s, t, x in zip(u, v, attrs[name].tolist())
+        )
+    elif attrs:
+        # Edges have both a color and a title
+        colors, titles = attrs['color'].tolist(), attrs['title'].tolist()
+        edges = (
+            (s, t, {'color': c, 'title': h})
+            for s, t, c, h in zip(u, v, colors, titles)
+        )
+    else:
+        edges = zip(u, v)
+    G.add_edges_from(edges)
 
     # Set node attributes (if any)
     if nodes_df is not None:
-        set_node_attributes(
-            G=G,
-            values=transform_nodes(
-                nodes_df=nodes_df,
-                id=nodes_id,
-                label=nodes_label,
-                color=nodes_color,
-                color_map=nodes_color_map,
-                hover=nodes_hover
-            )
-        )
+        set_node_attributes(G=G, values=node_attrs)
 
     # Return nx Graph
     return G